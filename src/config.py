@@ -23,6 +23,22 @@ FILE_PATHS = {
     'icd9_codes': "../Data/diagnosis_icd9_codes.csv"
 }
 
+# Small sample files, e.g. for sql_backend.assert_backends_match(SAMPLE_FILE_PATHS)
+SAMPLE_FILE_PATHS = {
+    'admissions': "../Data/admissions100lines.csv",
+    'patients': "../Data/patients100lines.csv",
+    'hosp_diagnosis': "../Data/diagnoses_icd100lines.csv",
+    'vitalsigns': "../Data/vitalsign10lines.csv",
+    'icd10_codes': "../Data/diagnosis_icd10_codes.csv",
+    'icd9_codes': "../Data/diagnosis_icd9_codes.csv"
+}
+
+# Medicare enrollment files (loaded by preprocessing.medicare, not the Preprocessor)
+MEDICARE_PATHS = {
+    'enrollment': "../Data/Medicare_Monthly_Enrollment_Data_Sept2024_Sample.csv",
+    'enrollment_store': "../Processed_Data/medicare_enrollment.parquet"
+}
+
 # Other configurations
 CONFIG = {
     'random_state': 42,
@@ -0,0 +1,137 @@
+"""Ragged (CSR) representation of per-admission diagnosis code sequences."""
+
+import numpy as np
+import pandas as pd
+
+
+class DiagnosisSequences:
+    """
+    Diagnosis codes grouped by admission, stored as an offsets array plus a codes array.
+
+    The codes of admission ``keys[i]`` are ``codes[offsets[i]:offsets[i + 1]]``, ordered by
+    seq_num. Each entry of ``codes`` indexes into the (icd_version, icd_code) vocabulary, so
+    a mapping only has to be evaluated once per distinct code instead of once per diagnosis.
+    """
+
+    def __init__(self, keys, offsets, codes, vocab_versions, vocab_codes, key_name='hadm_id'):
+        self.keys = np.asarray(keys)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.codes = np.asarray(codes, dtype=np.int32)
+        self.vocab_versions = np.asarray(vocab_versions, dtype=np.int8)
+        self.vocab_codes = np.asarray(vocab_codes, dtype=str)
+        self.key_name = key_name
+        if len(self.offsets) != len(self.keys) + 1 or self.offsets[-1] != len(self.codes):
+            raise ValueError("Offsets do not match the number of keys and codes")
+
+    @classmethod
+    def from_frame(cls, df, key='hadm_id', code_col='icd_code', version_col='icd_version',
+                   order_col='seq_num'):
+        """Builds the sequences from a long diagnosis DataFrame such as preprocess_diagnosis output."""
+        df = df[df[key].notna()]
+        sort_cols = [key, order_col] if order_col in df.columns else [key]
+        df = df.sort_values(sort_cols, kind='stable')
+
+        if df.empty:
+            return cls(np.array([], dtype=df[key].dtype), np.zeros(1, dtype=np.int64),
+                       np.array([], dtype=np.int32), np.array([], dtype=np.int8),
+                       np.array([], dtype=str), key_name=key)
+
+        vocab = pd.MultiIndex.from_arrays([
+            df[version_col].to_numpy(dtype=np.int8),
+            df[code_col].astype(str).str.strip().to_numpy()
+        ])
+        codes, uniques = vocab.factorize()
+
+        keys, starts = np.unique(df[key].to_numpy(), return_index=True)
+        offsets = np.append(starts, len(df))
+        return cls(keys, offsets, codes, uniques.get_level_values(0), uniques.get_level_values(1), key_name=key)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def row_ids(self):
+        """Row (admission) position of every entry in ``codes``."""
+        return np.repeat(np.arange(len(self.keys)), self.lengths)
+
+    # Queries
+    def nth(self, n):
+        """Returns the n-th (1-based) code of every admission, None where the admission is shorter."""
+        if n < 1:
+            raise ValueError(f"n must be at least 1, got {n}")
+        idx = self.offsets[:-1] + (n - 1)
+        valid = idx < self.offsets[1:]
+        result = np.full(len(self.keys), None, dtype=object)
+        result[valid] = self.vocab_codes[self.codes[idx[valid]]]
+        return pd.Series(result, index=self._index())
+
+    def contains(self, icd_codes, icd_version=None):
+        """Returns whether each admission has any of the given codes (a single code or a list)."""
+        if isinstance(icd_codes, str):
+            icd_codes = [icd_codes]
+        vocab_mask = np.isin(self.vocab_codes, list(icd_codes))
+        if icd_version is not None:
+            vocab_mask &= self.vocab_versions == icd_version
+        hits = self.row_ids[vocab_mask[self.codes]]
+        return pd.Series(np.bincount(hits, minlength=len(self.keys)) > 0, index=self._index())
+
+    def map_vocab(self, func):
+        """Applies ``func(icd_code, icd_version)`` once per distinct code and returns the results."""
+        return np.array([func(code, version) for code, version in zip(self.vocab_codes, self.vocab_versions)],
+                        dtype=object)
+
+    def first_mapped(self, func, unknown='Unknown'):
+        """
+        Returns, per admission, the first mapped value that is not ``unknown``.
+
+        Vectorized equivalent of Utils.code_map_from_icd_list, using each code's own ICD version.
+        """
+        mapped = self.map_vocab(func)
+        known = (mapped != unknown)[self.codes]
+        positions = np.flatnonzero(known)
+        rows = self.row_ids[positions]
+        # positions are sorted, so the first occurrence of each row is its first known code
+        rows, first = np.unique(rows, return_index=True)
+
+        result = np.full(len(self.keys), unknown, dtype=object)
+        result[rows] = mapped[self.codes[positions[first]]]
+        return pd.Series(result, index=self._index())
+
+    def to_lists(self):
+        """Returns a Series of per-admission code lists, as built by a groupby-agg-to-list."""
+        codes = self.vocab_codes[self.codes].tolist()
+        lists = [codes[start:end] for start, end in zip(self.offsets[:-1], self.offsets[1:])]
+        return pd.Series(lists, index=self._index())
+
+    # Persistence
+    def save(self, path):
+        """Saves the arrays to a compressed .npz file."""
+        np.savez_compressed(
+            path,
+            keys=self.keys,
+            offsets=self.offsets,
+            codes=self.codes,
+            vocab_versions=self.vocab_versions,
+            vocab_codes=self.vocab_codes,
+            key_name=np.array(self.key_name)
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Loads sequences saved with save()."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data['keys'],
+                data['offsets'],
+                data['codes'],
+                data['vocab_versions'],
+                data['vocab_codes'],
+                key_name=str(data['key_name'])
+            )
+
+    def _index(self):
+        return pd.Index(self.keys, name=self.key_name)
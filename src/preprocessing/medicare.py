@@ -0,0 +1,116 @@
+"""Streaming loader and indexed columnar store for CMS Medicare monthly enrollment data."""
+
+import pandas as pd
+
+# Identifier columns of the enrollment file; every other column is a beneficiary count.
+ID_COLUMNS = [
+    'YEAR', 'MONTH', 'BENE_GEO_LVL', 'BENE_STATE_ABRVTN',
+    'BENE_STATE_DESC', 'BENE_COUNTY_DESC', 'BENE_FIPS_CD'
+]
+INDEX_COLUMNS = ['YEAR', 'MONTH', 'BENE_FIPS_CD']
+GEO_LEVELS = ['National', 'State', 'County']
+MONTHS = [
+    'Year', 'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December'
+]
+# CMS suppresses small cells with '*'
+SUPPRESSED_VALUES = ['*']
+
+
+def load_medicare_enrollment(file_path, geo_levels=None, states=None, months=None,
+                             years=None, chunksize=100_000):
+    """
+    Streams the enrollment CSV in chunks, keeping only the requested rows.
+
+    Parameters:
+    - file_path (str): Path to the Medicare monthly enrollment CSV.
+    - geo_levels (list): Values of BENE_GEO_LVL to keep ('National', 'State', 'County'). Defaults to all.
+    - states (list): State abbreviations (BENE_STATE_ABRVTN) to keep. Defaults to all.
+    - months (list): Values of MONTH to keep ('Year' for the annual rows, or month names). Defaults to all.
+    - years (list): Values of YEAR to keep. Defaults to all.
+    - chunksize (int): Number of CSV rows parsed at a time.
+
+    Returns:
+    - pd.DataFrame indexed on (YEAR, MONTH, BENE_FIPS_CD), with counts stored as nullable UInt32.
+    """
+    id_dtypes = {col: str for col in ID_COLUMNS}
+    id_dtypes['YEAR'] = 'int16'
+
+    chunks = []
+    reader = pd.read_csv(
+        file_path,
+        dtype=id_dtypes,
+        na_values=SUPPRESSED_VALUES,
+        keep_default_na=False,
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        mask = pd.Series(True, index=chunk.index)
+        if geo_levels is not None:
+            mask &= chunk['BENE_GEO_LVL'].isin(geo_levels)
+        if states is not None:
+            mask &= chunk['BENE_STATE_ABRVTN'].isin(states)
+        if months is not None:
+            mask &= chunk['MONTH'].isin(months)
+        if years is not None:
+            mask &= chunk['YEAR'].isin(years)
+        chunk = chunk[mask]
+        if not chunk.empty:
+            chunks.append(_compact_counts(chunk))
+
+    if chunks:
+        df = pd.concat(chunks, ignore_index=True)
+    else:
+        df = _compact_counts(pd.read_csv(file_path, dtype=id_dtypes, nrows=0))
+    return _index_enrollment(df)
+
+
+def save_medicare_store(df, store_path):
+    """Writes the indexed enrollment DataFrame to a Parquet store."""
+    df.to_parquet(store_path)
+
+
+def read_medicare_store(store_path, years=None, months=None, fips_codes=None, columns=None):
+    """
+    Reads rows from the Parquet store, pushing the index filters down to the reader.
+
+    Parameters:
+    - store_path (str): Path written by save_medicare_store.
+    - years, months, fips_codes (list): Index values to select. Defaults to all.
+    - columns (list): Count columns to read. Defaults to all.
+
+    Returns:
+    - pd.DataFrame indexed on (YEAR, MONTH, BENE_FIPS_CD).
+    """
+    filters = []
+    if years is not None:
+        filters.append(('YEAR', 'in', list(years)))
+    if months is not None:
+        filters.append(('MONTH', 'in', list(months)))
+    if fips_codes is not None:
+        filters.append(('BENE_FIPS_CD', 'in', list(fips_codes)))
+    if columns is not None:
+        columns = INDEX_COLUMNS + [col for col in columns if col not in INDEX_COLUMNS]
+
+    df = pd.read_parquet(store_path, columns=columns, filters=filters or None)
+    if not isinstance(df.index, pd.MultiIndex):
+        df = df.set_index(INDEX_COLUMNS)
+    return df.sort_index()
+
+
+def _compact_counts(df):
+    count_columns = [col for col in df.columns if col not in ID_COLUMNS]
+    df = df.copy()
+    # Counts are written as e.g. '234590.0', so go through float before the integer cast
+    for col in count_columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype('UInt32')
+    df['BENE_FIPS_CD'] = df['BENE_FIPS_CD'].str.strip()
+    return df
+
+
+def _index_enrollment(df):
+    df['MONTH'] = pd.Categorical(df['MONTH'], categories=MONTHS, ordered=True)
+    df['BENE_GEO_LVL'] = pd.Categorical(df['BENE_GEO_LVL'], categories=GEO_LEVELS)
+    for col in ['BENE_STATE_ABRVTN', 'BENE_STATE_DESC', 'BENE_COUNTY_DESC']:
+        df[col] = df[col].astype('category')
+    return df.set_index(INDEX_COLUMNS).sort_index()
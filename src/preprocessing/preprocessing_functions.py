@@ -60,14 +60,21 @@ def preprocess_diagnosis(df, icd9_codes_path, icd10_codes_path):
         df[col] = df[col].astype('category')
 
     # Before dropping columns, print their non-null counts
-    columns_to_drop = ['seq_num', 'description', 'subcategory_icd9', 'subcategory_icd10', 'icd_code_icd9']
+    # seq_num is kept so DiagnosisSequences can order each admission's codes
+    columns_to_drop = ['description', 'subcategory_icd9', 'subcategory_icd10', 'icd_code_icd9']
     # Drop unnecessary columns
     df = df.drop(columns=columns_to_drop)
 
     return df
 
-def preprocess_admissions(df):
-    """Preprocesses the admissions DataFrame."""
+def preprocess_admissions(df, modes=None, los_bounds=None, categories=None):
+    """
+    Preprocesses the admissions DataFrame.
+
+    `modes`, `los_bounds` and `categories` (see admissions_population_stats) override the
+    imputation values, outlier bounds and category dictionaries computed from `df`, so a
+    shard matches a full run.
+    """
     Utils.convert_to_datetime(df, ['admittime', 'dischtime', 'edregtime', 'edouttime', 'deathtime'])
     Utils.compute_length_of_stay(df, 'admittime', 'dischtime', 'admission')
     df['race'] = df['race'].map(Utils.race_mapping)
@@ -77,22 +84,43 @@ def preprocess_admissions(df):
         'insurance', 'language', 'race', 'marital_status'
     ]
     for column in category_columns:
-        df[column] = df[column].astype('category')
+        if categories is None:
+            df[column] = df[column].astype('category')
+        else:
+            df[column] = pd.Categorical(df[column], categories=categories[column])
     df = df.drop(columns=['admit_provider_id'])
     df['is_dead'] = df['deathtime'].notna()
     # Start of Selection
     columns_to_impute = ['insurance', 'marital_status', 'language', 'admission_location']
+    if modes is None:
+        modes = {column: df[column].mode()[0] for column in columns_to_impute}
     for column in columns_to_impute:
-        df[column] = df[column].fillna(df[column].mode()[0])
+        df[column] = df[column].fillna(modes[column])
 
     # Filter out negative values for length of stay
     df = df[df['admission_los_hours'] > 0]
 
     # Remove outliers
-    df = Utils.filter_outliers(df, 'admission_los_hours')
+    df = Utils.filter_outliers(df, 'admission_los_hours', bounds=los_bounds)
 
     return df
 
+def admissions_population_stats(df):
+    """Computes the category dictionaries, imputation modes and LOS outlier bounds used by preprocess_admissions."""
+    df['race'] = df['race'].map(Utils.race_mapping)
+    df['discharge_location'] = df['discharge_location'].fillna('Unknown')
+    category_columns = [
+        'admission_type', 'admission_location', 'discharge_location',
+        'insurance', 'language', 'race', 'marital_status'
+    ]
+    categories = {column: df[column].astype('category').cat.categories for column in category_columns}
+    columns_to_impute = ['insurance', 'marital_status', 'language', 'admission_location']
+    modes = {column: df[column].mode()[0] for column in columns_to_impute}
+    Utils.convert_to_datetime(df, ['admittime', 'dischtime'])
+    Utils.compute_length_of_stay(df, 'admittime', 'dischtime', 'admission')
+    los = df.loc[df['admission_los_hours'] > 0, 'admission_los_hours']
+    return {'modes': modes, 'los_bounds': Utils.iqr_bounds(los), 'categories': categories}
+
 def preprocess_patients(df):
     """Preprocesses the patients DataFrame."""
     # Convert the dob column to datetime
@@ -135,21 +163,44 @@ def preprocess_transfers(df):
 
     return df
 
-def preprocess_triage(df):
-    """Processes the triage DataFrame."""
+def preprocess_triage(df, dictionary=None, lda_model=None):
+    """
+    Processes the triage DataFrame.
+
+    A `dictionary` and `lda_model` from triage_population_stats are used instead of
+    fitting the topic model on `df`, so a shard matches a full run.
+    """
     Utils.download_nltk_data()
     df['processed_complaints'] = df['chiefcomplaint'].apply(_preprocess_text)
-    df = _assign_topics(df)
+    df = _assign_topics(df, dictionary, lda_model)
     df = _convert_to_ordinal(df)
     df = df.drop(columns=['chiefcomplaint', 'processed_complaints'])
     return df
 
-def preprocess_vitalsigns(df):
-    """Cleans and preprocesses the vitalsigns DataFrame."""
+def triage_population_stats(df):
+    """Fits the complaint dictionary and LDA model used by preprocess_triage."""
+    Utils.download_nltk_data()
+    processed_complaints = df['chiefcomplaint'].apply(_preprocess_text)
+    dictionary, lda_model = _fit_topic_model(processed_complaints)
+    return {'dictionary': dictionary, 'lda_model': lda_model}
+
+def preprocess_vitalsigns(df, fill_pain=True):
+    """
+    Cleans and preprocesses the vitalsigns DataFrame.
+
+    The pain forward-fill runs across row order, so sharded runs pass fill_pain=False
+    and apply fill_vitalsigns_pain after merging.
+    """
     df_cleaned = _clean_vitalsigns(df)
-    df_cleaned['pain'] = df_cleaned['pain'].fillna(method='ffill')
+    if fill_pain:
+        df_cleaned = fill_vitalsigns_pain(df_cleaned)
     return df_cleaned
 
+def fill_vitalsigns_pain(df):
+    """Forward-fills missing pain scores."""
+    df['pain'] = df['pain'].fillna(method='ffill')
+    return df
+
 def preprocess_ed_stay(df):
     """Preprocesses the edstays DataFrame."""
     Utils.convert_to_datetime(df, ['intime', 'outtime'])
@@ -195,12 +246,17 @@ def _preprocess_text(text):
     tokens = [lemmatizer.lemmatize(word) for word in tokens if word not in stop_words]
     return tokens
 
-def _assign_topics(df):
-    dictionary = corpora.Dictionary(df['processed_complaints'])
+def _fit_topic_model(processed_complaints):
+    dictionary = corpora.Dictionary(processed_complaints)
     dictionary.filter_extremes(no_below=10, no_above=0.5)
-    corpus = [dictionary.doc2bow(doc) for doc in df['processed_complaints']]
+    corpus = [dictionary.doc2bow(doc) for doc in processed_complaints]
     num_topics = 5
     lda_model = LdaModel(corpus=corpus, id2word=dictionary, num_topics=num_topics, random_state=42, passes=10)
+    return dictionary, lda_model
+
+def _assign_topics(df, dictionary=None, lda_model=None):
+    if dictionary is None or lda_model is None:
+        dictionary, lda_model = _fit_topic_model(df['processed_complaints'])
     df['topic'] = df['processed_complaints'].apply(
         lambda complaint: _get_topic(complaint, lda_model, dictionary)
     )
@@ -220,6 +276,9 @@ def _convert_to_ordinal(df):
     return df
 
 def _get_topic(complaint, lda_model, dictionary):
+    # Inference draws its starting values from the model's RNG; reseed it per complaint so
+    # the topic does not depend on how many complaints were scored before (e.g. in a shard)
+    lda_model.random_state = np.random.RandomState(42)
     bow = dictionary.doc2bow(complaint)
     topic_distribution = lda_model.get_document_topics(bow)
     return max(topic_distribution, key=lambda x: x[1])[0]
@@ -10,10 +10,50 @@ from .preprocessing_functions import (
     preprocess_icu_stays,
     preprocess_prescriptions
 )
+from .sharding import SHARD_KEY, ROW_COLUMN, shard_mask, shard_dir
 
 class Preprocessor:
-    def __init__(self, file_paths):
+    def __init__(self, file_paths, n_shards=1, shard_index=0, population_stats=None,
+                 backends=None, sql_config=None):
+        """
+        Parameters:
+        - file_paths (dict): Table name to CSV path.
+        - n_shards (int): Number of shards the patients are split into. 1 processes everything.
+        - shard_index (int): Shard processed by this instance, in [0, n_shards).
+        - population_stats (dict): Output of sharding.compute_population_stats. Required when sharded.
+        - backends (str or dict): 'pandas' or 'duckdb', for all tables or per table name. Defaults to 'pandas'.
+          Tables without a DuckDB implementation (see sql_backend.SQL_TABLES) always use pandas.
+        - sql_config (dict): Keyword arguments for sql_backend.connect, e.g. temp_directory and memory_limit.
+        """
+        if not 0 <= shard_index < n_shards:
+            raise ValueError(f"shard_index must be in [0, {n_shards}), got {shard_index}")
+        if n_shards > 1 and population_stats is None:
+            raise ValueError("population_stats are required for sharded preprocessing")
         self.file_paths = file_paths
+        self.n_shards = n_shards
+        self.shard_index = shard_index
+        self.population_stats = population_stats or {}
+        self.backends = backends or {}
+        self.sql_config = sql_config or {}
+        self._sql_connection = None
+
+        if self.is_sharded and any(self.backend_for(name) == 'duckdb' for name in file_paths):
+            raise ValueError("The duckdb backend does not support sharded preprocessing")
+
+    @property
+    def is_sharded(self):
+        return self.n_shards > 1
+
+    def backend_for(self, table_name):
+        """Returns the backend ('pandas' or 'duckdb') used for a table."""
+        backend = self.backends if isinstance(self.backends, str) else self.backends.get(table_name, 'pandas')
+        if backend not in ('pandas', 'duckdb'):
+            raise ValueError(f"Unknown backend for {table_name}: {backend}")
+        if backend == 'duckdb':
+            from .sql_backend import SQL_TABLES
+            if table_name not in SQL_TABLES:
+                return 'pandas'
+        return backend
 
     def preprocess_all(self):
         preprocessed_data = {}
@@ -27,26 +67,30 @@ class Preprocessor:
         if table_name not in self.file_paths:
             raise ValueError(f"No file path found for table: {table_name}")
 
+        if self.backend_for(table_name) == 'duckdb':
+            return self.preprocess_table_sql(table_name)
+
         if table_name == 'prescriptions':
-            df = pd.read_csv(
-                self.file_paths[table_name],
+            df = self.read_table(
+                table_name,
                 usecols=['subject_id', 'hadm_id', 'drug_type', 'drug', 'gsn', 'ndc', 'prod_strength']
             )
         else:
-            df = pd.read_csv(self.file_paths[table_name])
+            df = self.read_table(table_name)
         # set the name of the dataframe
         df.name = table_name
+        stats = self.population_stats.get(table_name, {})
 
         if table_name == 'diagnosis':
             return preprocess_diagnosis(df, self.file_paths['icd9_codes'], self.file_paths['icd10_codes'])
         elif table_name == 'hosp_diagnosis':
             return preprocess_diagnosis(df, self.file_paths['icd9_codes'], self.file_paths['icd10_codes'])
         elif table_name == 'admissions':
-            return preprocess_admissions(df)
+            return preprocess_admissions(df, **stats)
         elif table_name == 'triage':
-            return preprocess_triage(df)
+            return preprocess_triage(df, **stats)
         elif table_name == 'vitalsigns':
-            return preprocess_vitalsigns(df)
+            return preprocess_vitalsigns(df, fill_pain=not self.is_sharded)
         elif table_name == 'edstays':
             return preprocess_ed_stay(df)
         elif table_name == 'patients':
@@ -61,6 +105,64 @@ class Preprocessor:
             print(f"Warning: No preprocessing function for {table_name}")
             return df
 
+    def preprocess_table_sql(self, table_name):
+        """Preprocesses a table with the out-of-core DuckDB backend."""
+        from . import sql_backend
+
+        if self._sql_connection is None:
+            self._sql_connection = sql_backend.connect(**self.sql_config)
+        con = self._sql_connection
+        file_path = self.file_paths[table_name]
+
+        if table_name in ('diagnosis', 'hosp_diagnosis'):
+            df = sql_backend.preprocess_diagnosis(
+                con, file_path, self.file_paths['icd9_codes'], self.file_paths['icd10_codes']
+            )
+        elif table_name == 'admissions':
+            df = sql_backend.preprocess_admissions(con, file_path)
+        elif table_name == 'vitalsigns':
+            df = sql_backend.preprocess_vitalsigns(con, file_path)
+        elif table_name == 'edstays':
+            df = sql_backend.preprocess_ed_stay(con, file_path)
+        elif table_name == 'patients':
+            df = sql_backend.preprocess_patients(con, file_path)
+        elif table_name == 'transfers':
+            df = sql_backend.preprocess_transfers(con, file_path)
+        elif table_name == 'icu_stays':
+            df = sql_backend.preprocess_icu_stays(con, file_path)
+        df.name = table_name
+        return df
+
+    def read_table(self, table_name, chunksize=1_000_000, **kwargs):
+        """Reads a table, keeping only this shard's patients when sharded."""
+        file_path = self.file_paths[table_name]
+        if not self.is_sharded:
+            return pd.read_csv(file_path, **kwargs)
+
+        columns = pd.read_csv(file_path, nrows=0).columns
+        if SHARD_KEY not in columns:
+            return pd.read_csv(file_path, **kwargs)
+
+        chunks = [
+            chunk[shard_mask(chunk[SHARD_KEY], self.n_shards, self.shard_index)]
+            for chunk in pd.read_csv(file_path, chunksize=chunksize, **kwargs)
+        ]
+        df = pd.concat(chunks)
+        df[ROW_COLUMN] = df.index
+        return df
+
+    def preprocess_and_save_shard(self, save_dir="../Processed_Data"):
+        """Preprocesses this shard's rows of every table and saves them under a shard-local directory."""
+        import os
+
+        output_dir = shard_dir(save_dir, self.n_shards, self.shard_index)
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        preprocessed_data = self.preprocess_all()
+        for table_name, df in preprocessed_data.items():
+            df.to_pickle(f"{output_dir}/{table_name}.pkl")
+
     def preprocess_and_save_all(self, save_dir="../Processed_Data"):
         import os
 
@@ -0,0 +1,143 @@
+"""Hash-sharded preprocessing: population pre-pass, shard assignment and deterministic merge."""
+
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+
+from .preprocessing_functions import (
+    admissions_population_stats,
+    triage_population_stats,
+    fill_vitalsigns_pain
+)
+
+SHARD_KEY = 'subject_id'
+# Original file row of each shard row, used to restore the single-node row order on merge
+ROW_COLUMN = '_row'
+# preprocess_diagnosis concatenates ICD-9 rows before ICD-10 rows and resets the index
+SORT_KEYS = {
+    'diagnosis': ['icd_version'],
+    'hosp_diagnosis': ['icd_version'],
+}
+RESET_INDEX_TABLES = {'diagnosis', 'hosp_diagnosis'}
+
+
+def shard_mask(subject_ids, n_shards, shard_index):
+    """Returns a boolean mask of the rows whose subject_id hashes to `shard_index`."""
+    hashes = pd.util.hash_pandas_object(subject_ids, index=False)
+    return (hashes % n_shards == shard_index).to_numpy()
+
+
+def shard_dir(save_dir, n_shards, shard_index):
+    return os.path.join(save_dir, f"shard_{shard_index:03d}_of_{n_shards:03d}")
+
+
+def compute_population_stats(file_paths):
+    """
+    Computes every statistic that depends on the whole population, for use by all shards.
+
+    Only the columns each statistic needs are read.
+
+    Returns:
+    - dict mapping table name to keyword arguments for its preprocessing function.
+    """
+    stats = {}
+    if 'admissions' in file_paths:
+        df = pd.read_csv(
+            file_paths['admissions'],
+            usecols=[
+                'admittime', 'dischtime', 'admission_type', 'admission_location', 'discharge_location',
+                'insurance', 'language', 'race', 'marital_status'
+            ]
+        )
+        stats['admissions'] = admissions_population_stats(df)
+    if 'triage' in file_paths:
+        df = pd.read_csv(file_paths['triage'], usecols=['chiefcomplaint'])
+        stats['triage'] = triage_population_stats(df)
+    return stats
+
+
+def save_population_stats(stats, path):
+    with open(path, 'wb') as f:
+        pickle.dump(stats, f)
+
+
+def load_population_stats(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def merge_shards(table_names, n_shards, save_dir="../Processed_Data"):
+    """
+    Combines the shard-local outputs into `{save_dir}/{table_name}.pkl`.
+
+    Rows are put back in single-node order, categorical columns not fixed by the pre-pass get
+    the sorted union of the shard categories (what astype('category') gives on the full table),
+    and steps that run across row order are applied after the merge.
+    """
+    for table_name in table_names:
+        shards = [
+            pd.read_pickle(os.path.join(shard_dir(save_dir, n_shards, k), f"{table_name}.pkl"))
+            for k in range(n_shards)
+        ]
+        df = _merge_table(table_name, shards)
+        df.to_pickle(f"{save_dir}/{table_name}.pkl")
+        print(f"Merged {n_shards} shards of {table_name} into {save_dir}/{table_name}.pkl ({len(df)} rows)")
+
+
+def preprocess_sharded(file_paths, n_shards, save_dir="../Processed_Data", max_workers=None):
+    """
+    Runs the population pre-pass, preprocesses each shard in its own worker process and merges.
+
+    On a cluster, run the pre-pass once, then on node k:
+    Preprocessor(file_paths, n_shards, k, load_population_stats(path)).preprocess_and_save_shard(save_dir),
+    and finally merge_shards once all shards are written.
+    """
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+
+    stats_path = os.path.join(save_dir, "population_stats.pkl")
+    save_population_stats(compute_population_stats(file_paths), stats_path)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_run_shard, file_paths, n_shards, k, stats_path, save_dir)
+            for k in range(n_shards)
+        ]
+        for future in futures:
+            future.result()
+
+    merge_shards(file_paths.keys(), n_shards, save_dir)
+
+
+def _run_shard(file_paths, n_shards, shard_index, stats_path, save_dir):
+    from .preprocessor import Preprocessor
+
+    preprocessor = Preprocessor(file_paths, n_shards, shard_index, load_population_stats(stats_path))
+    preprocessor.preprocess_and_save_shard(save_dir)
+
+
+def _merge_table(table_name, shards):
+    # Reference tables (e.g. ICD code lists) are not sharded, so every shard holds the full table
+    if ROW_COLUMN not in shards[0].columns:
+        return shards[0]
+
+    non_empty = [shard for shard in shards if len(shard) > 0] or shards[:1]
+    for column in shards[0].columns:
+        dtype = shards[0][column].dtype
+        if isinstance(dtype, CategoricalDtype) and not dtype.ordered:
+            categories = sorted(set().union(*(shard[column].cat.categories for shard in shards)))
+            for shard in non_empty:
+                shard[column] = shard[column].cat.set_categories(categories)
+
+    df = pd.concat(non_empty)
+    df = df.sort_values(SORT_KEYS.get(table_name, []) + [ROW_COLUMN], kind='stable')
+    df = df.drop(columns=[ROW_COLUMN])
+    if table_name in RESET_INDEX_TABLES:
+        df = df.reset_index(drop=True)
+
+    if table_name == 'vitalsigns':
+        df = fill_vitalsigns_pain(df)
+    return df
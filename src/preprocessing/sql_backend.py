@@ -0,0 +1,382 @@
+"""
+Out-of-core DuckDB backend for the relational preprocessing steps.
+
+Each function mirrors its pandas counterpart in preprocessing_functions: the CSV is scanned,
+converted, mapped, filtered and joined inside DuckDB (which spills to disk past its memory
+limit), and only the final rows are fetched into pandas, where the category dtypes are applied.
+"""
+
+import duckdb
+import numpy as np
+import pandas as pd
+from config import DISEASE_CATEGORY_MAPPING, CAREUNIT_MAPPING
+from .utils import Utils
+from .sharding import ROW_COLUMN
+from .preprocessing_functions import fill_vitalsigns_pain
+
+# Tables with a DuckDB implementation; everything else always runs on pandas
+SQL_TABLES = {
+    'diagnosis', 'hosp_diagnosis', 'admissions', 'vitalsigns',
+    'edstays', 'patients', 'transfers', 'icu_stays'
+}
+INTEGER_TYPES = {'TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT'}
+# Text pandas' CSV parser reads as int64 / float64
+INTEGER_PATTERN = r'[+-]?[0-9]+'
+DECIMAL_PATTERN = r'[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?'
+
+
+def connect(database=':memory:', temp_directory=None, memory_limit=None, threads=None):
+    """
+    Opens a DuckDB connection for preprocessing.
+
+    Parameters:
+    - database (str): DuckDB database file. Defaults to in-memory, which still spills to temp_directory.
+    - temp_directory (str): Directory DuckDB spills to once memory_limit is reached.
+    - memory_limit (str): e.g. '8GB'.
+    - threads (int): Number of DuckDB worker threads.
+    """
+    con = duckdb.connect(database)
+    # Keep scan order so row numbers follow the file, as pandas' index does
+    con.execute("SET preserve_insertion_order = true")
+    if temp_directory is not None:
+        con.execute(f"SET temp_directory = '{_quote(temp_directory)}'")
+    if memory_limit is not None:
+        con.execute(f"SET memory_limit = '{_quote(memory_limit)}'")
+    if threads is not None:
+        con.execute(f"SET threads = {int(threads)}")
+    return con
+
+
+def preprocess_diagnosis(con, file_path, icd9_codes_path, icd10_codes_path):
+    """Processes the diagnosis table for both ICD-9 and ICD-10 codes."""
+    _load(con, 'diagnosis_raw', file_path, types={'icd_code': 'VARCHAR'})
+    _load(con, 'icd9_codes', icd9_codes_path)
+    _load(con, 'icd10_codes', icd10_codes_path)
+    _register_mapping(con, 'category_mapping', DISEASE_CATEGORY_MAPPING)
+
+    df = _fetch(con, f"""
+        WITH icd9 AS (
+            -- Like pandas' astype(str), an integer-parsed '070' becomes '70' and does not match
+            SELECT d.*, substr(d.icd_code, 1, 3) AS category_code,
+                   c.category, c.subcategory, c.{ROW_COLUMN} AS _code_row, 0 AS _branch
+            FROM diagnosis_raw d
+            LEFT JOIN icd9_codes c ON substr(d.icd_code, 1, 3) = CAST(c.icd_code AS VARCHAR)
+            WHERE d.icd_version = 9
+        ),
+        icd10_blocks AS (
+            SELECT category, block_title, letter_code FROM (
+                SELECT category, block_title, substr(block_code, 1, 2) AS letter_code,
+                       row_number() OVER (PARTITION BY substr(block_code, 1, 2) ORDER BY {ROW_COLUMN}) AS rn
+                FROM icd10_codes
+            ) WHERE rn = 1
+        ),
+        icd10 AS (
+            SELECT d.*, substr(d.icd_code, 1, 3) AS category_code,
+                   b.category, b.block_title AS subcategory, NULL::BIGINT AS _code_row, 1 AS _branch
+            FROM diagnosis_raw d
+            LEFT JOIN icd10_blocks b ON substr(d.icd_code, 1, 2) = b.letter_code
+            WHERE d.icd_version = 10
+        )
+        SELECT * EXCLUDE (category, subcategory, _code_row, _branch, mapping_key, mapping_value),
+               coalesce(mapping_value, 'Other') AS category,
+               coalesce(subcategory, 'Other') AS subcategory
+        FROM (SELECT * FROM icd9 UNION ALL SELECT * FROM icd10) u
+        LEFT JOIN category_mapping ON u.category = category_mapping.mapping_key
+        ORDER BY _branch, {ROW_COLUMN}, _code_row
+    """)
+    # The pandas version concatenates ICD-9 and ICD-10 rows with a fresh index
+    df = df.reset_index(drop=True)
+
+    for col in ['category_code', 'icd_code', 'category', 'subcategory']:
+        df[col] = df[col].astype('category')
+    return df
+
+
+def preprocess_admissions(con, file_path):
+    """Preprocesses the admissions table."""
+    datetime_columns = ['admittime', 'dischtime', 'edregtime', 'edouttime', 'deathtime']
+    _load(con, 'admissions_raw', file_path)
+    _register_mapping(con, 'race_mapping', Utils.race_mapping)
+
+    conversions = ", ".join(f"TRY_CAST({col} AS TIMESTAMP) AS {col}" for col in datetime_columns)
+    los = _los_hours("TRY_CAST(admittime AS TIMESTAMP)", "TRY_CAST(dischtime AS TIMESTAMP)")
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE admissions_stage AS
+        SELECT * EXCLUDE (admit_provider_id, mapping_key, mapping_value) REPLACE (
+                   {conversions},
+                   mapping_value AS race,
+                   coalesce(discharge_location, 'Unknown') AS discharge_location
+               ),
+               {los} AS admission_los_hours,
+               TRY_CAST(deathtime AS TIMESTAMP) IS NOT NULL AS is_dead
+        FROM admissions_raw
+        LEFT JOIN race_mapping ON admissions_raw.race = race_mapping.mapping_key
+    """)
+
+    # Categories, modes and outlier bounds are taken at the same point as in the pandas version
+    category_columns = [
+        'admission_type', 'admission_location', 'discharge_location',
+        'insurance', 'language', 'race', 'marital_status'
+    ]
+    categories = {col: _categories(con, 'admissions_stage', col) for col in category_columns}
+    columns_to_impute = ['insurance', 'marital_status', 'language', 'admission_location']
+    modes = [_mode(con, 'admissions_stage', col) for col in columns_to_impute]
+    positive_los = con.execute(
+        "SELECT admission_los_hours FROM admissions_stage WHERE admission_los_hours > 0"
+    ).df()['admission_los_hours']
+    lower_bound, upper_bound = Utils.iqr_bounds(positive_los)
+
+    imputations = ", ".join(f"coalesce({col}, ?) AS {col}" for col in columns_to_impute)
+    df = _fetch(con, f"""
+        SELECT * REPLACE ({imputations})
+        FROM admissions_stage
+        WHERE admission_los_hours > 0
+          AND admission_los_hours >= ? AND admission_los_hours <= ?
+        ORDER BY {ROW_COLUMN}
+    """, modes + [lower_bound, upper_bound], datetime_columns)
+
+    for col in category_columns:
+        df[col] = pd.Categorical(df[col], categories=categories[col])
+    return df
+
+
+def preprocess_patients(con, file_path):
+    """Preprocesses the patients table."""
+    _load(con, 'patients_raw', file_path)
+    df = _fetch(con, f"""
+        SELECT * REPLACE (CAST(dod AS TIMESTAMP) AS dod),
+               dod IS NOT NULL AS is_dead
+        FROM patients_raw
+        ORDER BY {ROW_COLUMN}
+    """, datetime_columns=['dod'])
+
+    for col in ['anchor_year_group', 'gender']:
+        df[col] = df[col].astype('category')
+    return df
+
+
+def preprocess_transfers(con, file_path):
+    """Preprocesses the transfers table."""
+    _load(con, 'transfers_raw', file_path)
+    _register_mapping(con, 'careunit_mapping', CAREUNIT_MAPPING)
+
+    los = _los_hours("CAST(intime AS TIMESTAMP)", "CAST(outtime AS TIMESTAMP)")
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE transfers_stage AS
+        SELECT * EXCLUDE (mapping_key, mapping_value) REPLACE (
+                   CAST(intime AS TIMESTAMP) AS intime,
+                   CASE WHEN eventtype = 'discharge' THEN CAST(intime AS TIMESTAMP)
+                        ELSE CAST(outtime AS TIMESTAMP) END AS outtime
+               ),
+               CASE WHEN eventtype = 'discharge' THEN 0.0 ELSE {los} END AS los,
+               coalesce(mapping_value, 'Observation/Other') AS careunit_grouped
+        FROM transfers_raw
+        LEFT JOIN careunit_mapping ON transfers_raw.careunit = careunit_mapping.mapping_key
+    """)
+
+    # Categories are taken before dropping rows with missing los, as in the pandas version
+    category_columns = ['careunit', 'careunit_grouped', 'eventtype']
+    categories = {col: _categories(con, 'transfers_stage', col) for col in category_columns}
+    df = _fetch(con, f"""
+        SELECT * FROM transfers_stage
+        WHERE los IS NOT NULL
+        ORDER BY {ROW_COLUMN}
+    """, datetime_columns=['intime', 'outtime'])
+
+    for col in category_columns:
+        df[col] = pd.Categorical(df[col], categories=categories[col])
+    return df
+
+
+def preprocess_vitalsigns(con, file_path, fill_pain=True):
+    """Cleans and preprocesses the vitalsigns table."""
+    valid_ranges = {
+        'temperature': (95.0, 107.6),
+        'heartrate': (20, 250),
+        'resprate': (4, 60),
+        'o2sat': (70, 100),
+        'sbp': (50, 250),
+        'dbp': (20, 150)
+    }
+    # Columns pandas leaves as strings
+    _load(con, 'vitalsigns_raw', file_path, types={'charttime': 'VARCHAR', 'rhythm': 'VARCHAR', 'pain': 'VARCHAR'})
+
+    # Nulling out-of-range values and then dropping rows with nulls keeps exactly the in-range rows
+    in_range = {col: f"{col} BETWEEN {lower} AND {upper}" for col, (lower, upper) in valid_ranges.items()}
+    # pandas' nulling turns an integer column with any out-of-range value into float64
+    out_of_range = con.execute(
+        "SELECT " + ", ".join(f"count(*) FILTER (WHERE NOT ({condition}))" for condition in in_range.values())
+        + " FROM vitalsigns_raw"
+    ).fetchone()
+    column_types = dict(con.execute(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = 'vitalsigns_raw'"
+    ).fetchall())
+    widened = [
+        f"CAST({col} AS DOUBLE) AS {col}"
+        for col, count in zip(in_range, out_of_range)
+        if count and column_types[col] in INTEGER_TYPES
+    ]
+    replace = f" REPLACE ({', '.join(widened)})" if widened else ""
+    df = _fetch(con, f"""
+        SELECT *{replace} FROM vitalsigns_raw
+        WHERE {" AND ".join(in_range.values())}
+        ORDER BY {ROW_COLUMN}
+    """)
+    if fill_pain:
+        df = fill_vitalsigns_pain(df)
+    return df
+
+
+def preprocess_ed_stay(con, file_path):
+    """Preprocesses the edstays table."""
+    _load(con, 'edstays_raw', file_path)
+    _register_mapping(con, 'race_mapping', Utils.race_mapping)
+
+    los = _los_hours("TRY_CAST(intime AS TIMESTAMP)", "TRY_CAST(outtime AS TIMESTAMP)")
+    df = _fetch(con, f"""
+        SELECT * EXCLUDE (mapping_key, mapping_value) REPLACE (
+                   TRY_CAST(intime AS TIMESTAMP) AS intime,
+                   TRY_CAST(outtime AS TIMESTAMP) AS outtime,
+                   mapping_value AS race
+               ),
+               {los} AS ed_los_hours,
+               hadm_id IS NOT NULL AS admitted
+        FROM edstays_raw
+        LEFT JOIN race_mapping ON edstays_raw.race = race_mapping.mapping_key
+        ORDER BY {ROW_COLUMN}
+    """, datetime_columns=['intime', 'outtime'])
+
+    for col in ['gender', 'race', 'arrival_transport', 'disposition']:
+        df[col] = df[col].astype('category')
+    return df
+
+
+def preprocess_icu_stays(con, file_path):
+    """Preprocesses the icustays table."""
+    _load(con, 'icu_stays_raw', file_path)
+    df = _fetch(con, f"""
+        SELECT * REPLACE (
+            CAST(intime AS TIMESTAMP) AS intime,
+            CAST(outtime AS TIMESTAMP) AS outtime
+        )
+        FROM icu_stays_raw
+        ORDER BY {ROW_COLUMN}
+    """, datetime_columns=['intime', 'outtime'])
+
+    for col in ['first_careunit', 'last_careunit']:
+        df[col] = df[col].astype('category')
+    return df
+
+
+def assert_backends_match(file_paths, table_names=None, sql_config=None):
+    """Runs both backends on each SQL-capable table and asserts the outputs are identical."""
+    from .preprocessor import Preprocessor
+
+    if table_names is None:
+        table_names = [name for name in file_paths if name in SQL_TABLES]
+    pandas_preprocessor = Preprocessor(file_paths)
+    sql_preprocessor = Preprocessor(file_paths, backends='duckdb', sql_config=sql_config)
+    for table_name in table_names:
+        pd.testing.assert_frame_equal(
+            sql_preprocessor.preprocess_table(table_name),
+            pandas_preprocessor.preprocess_table(table_name),
+            obj=table_name
+        )
+        print(f"{table_name}: pandas and duckdb backends match")
+
+
+# Helper functions
+def _quote(value):
+    return str(value).replace("'", "''")
+
+
+def _load(con, table_name, file_path, types=None):
+    """Loads a CSV into a DuckDB table, numbering rows in file order."""
+    options = "header = true, sample_size = -1"
+    if types:
+        options += ", types = {" + ", ".join(f"'{col}': '{dtype}'" for col, dtype in types.items()) + "}"
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {table_name} AS
+        SELECT *, row_number() OVER () - 1 AS {ROW_COLUMN}
+        FROM read_csv('{_quote(file_path)}', {options})
+    """)
+
+    columns = con.execute(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = ?", [table_name]
+    ).fetchall()
+
+    # DuckDB keeps numbers with leading zeros or a '+' sign (e.g. ICD-9 '070', '098.6') as VARCHAR,
+    # where pandas parses them. Match pandas' number syntax strictly: TRY_CAST also accepts
+    # '1_000' or ' 12' and rounds '1.5' to BIGINT.
+    varchar_columns = [name for name, dtype in columns if dtype == 'VARCHAR' and name not in (types or {})]
+    if varchar_columns:
+        counts = con.execute(
+            "SELECT " + ", ".join(
+                f"count(\"{col}\"), "
+                f"count(*) FILTER (WHERE regexp_full_match(\"{col}\", '{INTEGER_PATTERN}')), "
+                f"count(*) FILTER (WHERE regexp_full_match(\"{col}\", '{DECIMAL_PATTERN}'))"
+                for col in varchar_columns
+            ) + f" FROM {table_name}"
+        ).fetchone()
+        for i, col in enumerate(varchar_columns):
+            non_null, integers, decimals = counts[3 * i:3 * i + 3]
+            if non_null and non_null == integers:
+                con.execute(f'ALTER TABLE {table_name} ALTER "{col}" TYPE BIGINT')
+            elif non_null and non_null == decimals:
+                con.execute(f'ALTER TABLE {table_name} ALTER "{col}" TYPE DOUBLE')
+        columns = con.execute(
+            "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = ?", [table_name]
+        ).fetchall()
+
+    # pandas reads integer columns with missing values as float64
+    integer_columns = [name for name, dtype in columns if dtype in INTEGER_TYPES and name != ROW_COLUMN]
+    if integer_columns:
+        null_counts = con.execute(
+            "SELECT " + ", ".join(f'count(*) - count("{col}")' for col in integer_columns) + f" FROM {table_name}"
+        ).fetchone()
+        for col, null_count in zip(integer_columns, null_counts):
+            if null_count:
+                con.execute(f'ALTER TABLE {table_name} ALTER "{col}" TYPE DOUBLE')
+
+
+def _register_mapping(con, name, mapping):
+    con.register(name, pd.DataFrame({
+        'mapping_key': list(mapping.keys()),
+        'mapping_value': list(mapping.values())
+    }))
+
+
+def _los_hours(start, end):
+    # Same value as pandas' (end - start).dt.total_seconds() / 3600.0 for whole-second timestamps
+    return f"((epoch_us({end}) - epoch_us({start})) / 1e6 / 3600.0)"
+
+
+def _categories(con, table_name, column):
+    """Sorted distinct values, i.e. the categories astype('category') would produce."""
+    rows = con.execute(
+        f"SELECT DISTINCT {column} FROM {table_name} WHERE {column} IS NOT NULL ORDER BY {column}"
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def _mode(con, table_name, column):
+    """Most frequent value, breaking ties on the smallest value like Series.mode()[0]."""
+    return con.execute(f"""
+        SELECT {column} FROM {table_name}
+        WHERE {column} IS NOT NULL
+        GROUP BY {column}
+        ORDER BY count(*) DESC, {column}
+        LIMIT 1
+    """).fetchone()[0]
+
+
+def _fetch(con, query, params=None, datetime_columns=()):
+    """Runs the final query and shapes the result like the pandas backend's output."""
+    df = con.execute(query, params or []).df()
+    df.index = df.pop(ROW_COLUMN).to_numpy()
+    for col in datetime_columns:
+        df[col] = df[col].astype('datetime64[ns]')
+    # DuckDB returns None for missing strings where pandas has NaN
+    for col in df.select_dtypes(include='object').columns:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
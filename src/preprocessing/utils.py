@@ -1,5 +1,6 @@
 """Utility functions and classes for data preprocessing."""
 
+import ast
 import pandas as pd
 import numpy as np
 from IPython.display import display
@@ -108,13 +109,19 @@ class Utils:
 
     # Data Cleaning Methods
     @staticmethod
-    def filter_outliers(df, column, method='IQR'):
+    def iqr_bounds(series):
+        Q1 = series.quantile(0.25)
+        Q3 = series.quantile(0.75)
+        IQR = Q3 - Q1
+        return Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+
+    @staticmethod
+    def filter_outliers(df, column, method='IQR', bounds=None):
+        """Drop outlier rows; pass precomputed IQR `bounds` to filter against population-wide quantiles."""
         if method == 'IQR':
-            Q1 = df[column].quantile(0.25)
-            Q3 = df[column].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
+            if bounds is None:
+                bounds = Utils.iqr_bounds(df[column])
+            lower_bound, upper_bound = bounds
             df_filtered = df[(df[column] >= lower_bound) &
                              (df[column] <= upper_bound)]
         elif method == 'Z-score':
@@ -175,7 +182,7 @@ class Utils:
             return x[0]
         elif isinstance(x, str):
             try:
-                lst = eval(x)
+                lst = ast.literal_eval(x)
                 if isinstance(lst, list) and len(lst) > 0:
                     return lst[0]
             except:
@@ -212,16 +219,20 @@ class Utils:
         for i in range(1, len(icd_list)+1):
             code = Utils.get_n_element(icd_list, i)
             if code:
-                if len(code) > 3:
-                    code = code[:3] + "." + code[3:]
-                if row['primary_ICD_version'] == 9:
-                    result = Utils.get_disease_for_icd(code, icd9_ranges)
-                else:
-                    result = Utils.get_disease_for_icd(code, icd10_ranges)
+                result = Utils.disease_for_code(code, row['primary_ICD_version'], icd9_ranges, icd10_ranges)
                 if result != "Unknown":
                     return result
         return "Unknown"
 
+    @staticmethod
+    def disease_for_code(code, icd_version, icd9_ranges, icd10_ranges):
+        """Map a single undotted ICD code to its disease, e.g. for DiagnosisSequences.first_mapped."""
+        if len(code) > 3:
+            code = code[:3] + "." + code[3:]
+        if icd_version == 9:
+            return Utils.get_disease_for_icd(code, icd9_ranges)
+        return Utils.get_disease_for_icd(code, icd10_ranges)
+
     @staticmethod
     def get_disease_for_icd(icd_code, icd_ranges):
         for disease, ranges in icd_ranges.items():